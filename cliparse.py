@@ -1,39 +1,48 @@
 """ This handles the parsing of command line arguments.
 """
+from __future__ import annotations
 import sys
-import re
-from util import Void
+from util import Undefined, Ambiguous
 import micro_inspect as mui
-from typing import Callable, Union, Tuple
+from collections.abc import Callable
 from itertools import takewhile
+from string import ascii_letters
 
 
-# Regexes for parsing command-line options
-shflag_p = re.compile(r"^-([a-zA-Z])")
-lflag_p = re.compile(r"^--([a-zA-Z][-a-zA-Z]+)")
-sharg_p = re.compile(r"^-([a-zA-Z]):(.+)")
-larg_p = re.compile(r"^--([a-zA-Z][-a-zA-Z]+)=(.+)")
+# Characters allowed in command-line option names
+OPT_CHARS = frozenset(ascii_letters)
+LOPT_CHARS = OPT_CHARS | {"-"}
+
+# Translation table from command-line option names to Python names
+CLI2PY = str.maketrans("-", "_")
 
 # Global constants
-Unknown = Void.UNKNOWN
-Undefined = Void.UNDEFINED
-Nil = Void.NIL
 COMMON_FLAGS = {"d", "debug", "h", "help"}
 
 
 def parsearg(arg: str) -> tuple:
-    # Try to parse the argument using the regexes above
-    # If all regexes fail, return a tuple whose first element
-    # is None, signifying no match
-    if (m := shflag_p.match(arg) or lflag_p.match(arg)):
-        return m[1].replace("-", "_"), True
+    # Scan the argument for one of the option forms -x, -x:val, --opt,
+    # or --opt=val. If the argument doesn't have any of these forms,
+    # return a tuple whose first element is None, signifying no match
+    if arg[:2] == "--":
+        eq = arg.find("=", 2)
+        opt = arg[2:] if eq < 0 else arg[2:eq]
+
+        if len(opt) > 1 and opt[0] in OPT_CHARS and LOPT_CHARS.issuperset(opt):
+            if eq < 0:
+                return opt.translate(CLI2PY), True
+
+            elif eq + 1 < len(arg):
+                return opt.translate(CLI2PY), arg[eq + 1:]
+
+    elif arg[:1] == "-" and len(arg) > 1 and arg[1] in OPT_CHARS:
+        if len(arg) == 2:
+            return arg[1], True
 
-    elif (m := sharg_p.match(arg) or larg_p.match(arg)):
-        opt, val = m.groups()
-        return opt.replace("-", "_"), val
+        elif arg[2] == ":" and len(arg) > 3:
+            return arg[1], arg[3:]
 
-    else:
-        return None, arg
+    return None, arg
 
 
 def parseargs(argv: list) -> tuple:
@@ -42,46 +51,96 @@ def parseargs(argv: list) -> tuple:
     # the raw sys.argv, so we'll strip the first argument.)
     positionals = []
     options = {}
+    addpositional = positionals.append
+    intern = sys.intern
+    scanarg = parsearg
 
     for arg in argv:
-        arg, val = parsearg(arg)
+        # Anything that doesn't start with a dash can only be a positional,
+        # so skip the call to parsearg entirely
+        if arg[:1] != "-":
+            addpositional(arg)
+            continue
+
+        arg, val = scanarg(arg)
 
         if arg is None:
-            positionals.append(val)
+            addpositional(val)
 
         else:
-            options[arg] = val
+            # Interned keys let the argspec lookups in matchargs compare by identity
+            options[intern(arg)] = val
 
     return positionals, options
 
 
-def matchargs(positionals: list, options: dict, argspec: dict) -> tuple:
+def makeresolver(argspec: mui.ArgSpec) -> Callable:
+    """ Build a function that matches supplied options against the keyword arguments
+        in argspec. The returned function is called with the options, the dict of
+        matched keyword arguments, and the set of unmatched names (both of which it
+        updates), and returns an error message, or None if every option matched.
+        Building it once per argspec keeps the lookups it needs in closure locals.
+    """
+    getprefix = argspec.prefixes.get
+    hasvarkw = argspec.hasvarkw
+    commonflags = COMMON_FLAGS
+
+    def resolve(options: dict, kw_out: dict, unmatched: set) -> str | None:
+        for o, v in options.items():
+            if o in commonflags:
+                kw_out[o] = v
+
+            # A prefix shared by several names may still be unambiguous among
+            # the names that haven't been matched yet
+            if (target := getprefix(o)) is Ambiguous:
+                m = [u for u in unmatched if u.startswith(o)]
+                target = m[0] if len(m) == 1 else None
+
+            if target in unmatched:
+                kw_out[target] = v
+                unmatched.discard(target)
+
+            elif hasvarkw:
+                kw_out[o] = v
+
+            else:
+                return f"Couldn't find unambiguos match for option {o}"
+
+        return None
+
+    return resolve
+
+
+def matchargs(positionals: list, options: dict, argspec: mui.ArgSpec,
+              resolve: Callable | None = None) -> tuple:
     """ Check that the function that produced argspec can be called with the supplied
         positionals and options. If it can, return a tuple of positionals and keyword
         arguments ready to be called (fun(*t[0], **t[1])). Otherwise, return an empty
-        tuple.
+        tuple. resolve is the option matcher from makeresolver(argspec); if it isn't
+        supplied, one is built for this call.
     """
     # create containers for the matched arguments
-    p_out = []
     kw_out = {}
-    va_out = [] if argspec["hasvargs"] else None
+    va_out = [] if argspec.hasvargs else None
+
+    if resolve is None:
+        resolve = makeresolver(argspec)
 
 
     npos_given = len(positionals)
     nkw_given = len(options)
 
-    hasvargs = argspec["hasvargs"]
-    hasvarkw = argspec["hasvarkw"]
-    names = argspec["names"]
-    posxnames = argspec["posxnames"]
-    kwxnames = argspec["kwxnames"]
-    ambnames = argspec["ambnames"]
-    ambco = argspec["ambargco"]
-    defaults = argspec["defaults"]
-    minpos = sum(k == mui.PosArg and d == Undefined for _, _, d, k, _ in mui.iterargspec(argspec))
-    maxpos = ambco + minpos
-    minkw = sum(k == mui.KwArg and d == Undefined for _, _, d, k, _ in mui.iterargspec(argspec))
-    maxkw = minkw + ambco
+    hasvargs = argspec.hasvargs
+    hasvarkw = argspec.hasvarkw
+    names = argspec.names
+    posnames = argspec.posnames
+    kwxnames = argspec.kwxnames
+    defaults = argspec.defaults
+    required = argspec.required
+    minpos = argspec.minpos
+    maxpos = argspec.maxpos
+    minkw = argspec.minkw
+    maxkw = argspec.maxkw
 
     if npos_given < minpos or nkw_given < minkw:
         return None, "insufficient arguments"
@@ -91,62 +150,37 @@ def matchargs(positionals: list, options: dict, argspec: dict) -> tuple:
         return None, "too many arguments"
 
     # ASSERT: the number of arguments is consistent with the spec
-    unmatched = list(names[:-1*(hasvargs + hasvarkw)])
-    posnames = list(reversed(posxnames + ambnames))
-    positionals.reverse()
+    # The positionally matched names are always a prefix of names, so match
+    # them by index instead of popping and removing names one at a time
+    n_matched = min(npos_given, len(posnames))
+    p_out = positionals[:n_matched]
+    unmatched = set(names[n_matched:-(hasvargs + hasvarkw) or None])
 
-    while positionals and posnames:
-        p_out.append(positionals.pop())
-        unmatched.remove(posnames.pop())
-
-    if positionals:
+    if npos_given > n_matched:
         if hasvargs:
-            p_out.extend(reversed(positionals))
+            p_out.extend(positionals[n_matched:])
 
         else:
             return None, "too many positionals"
 
-    if posnames:
-        for p in posnames:
-            if defaults[p] is Undefined:
-                return None, f"missing default for {p}"
+    for p in posnames[n_matched:]:
+        if defaults[p] is Undefined:
+            return None, f"missing default for {p}"
 
-            else:
-                p_out.append(defaults[p])
-                unmatched.remove(p)
+        else:
+            p_out.append(defaults[p])
+            unmatched.discard(p)
 
     # ASSERT: All positionals have been matched
     # Next, attempt to match the options
-    for o in options:
-        if o in COMMON_FLAGS:
-            kw_out[o] = options[o]
+    if (err := resolve(options, kw_out, unmatched)) is not None:
+        return None, err
 
-        if o in unmatched:
-            kw_out[o] = options[o]
-            unmatched.remove(o)
+    if (missing := unmatched & required):
+        return None, f"Couldn't match all: {missing}"
 
-        elif len((m := [u for u in unmatched if u.startswith(o)])) == 1:
-            try:
-                mo = m[0]
-                kw_out[mo] = options[o]
-                unmatched.remove(mo)
-
-            except ValueError as e:
-                print(f"Tried to remove non-matching option {mo}.")
-                raise e
-
-        elif hasvarkw:
-            kw_out[o] = options[o]
-
-        else:
-            return None, f"Couldn't find unambiguos match for option {o}"
-            
-    for u in unmatched:
-        if defaults[u] is Undefined:
-            return None, f"Couldn't match all: {unmatched}"
-
-        else:
-            kw_out[u] = defaults[u]
+    # Everything still unmatched has a default
+    kw_out.update((u, defaults[u]) for u in unmatched)
 
     # ASSERT: All keyword arguments have been matched and all options have matched a keyword
     # argument
@@ -3,14 +3,20 @@
 """
 
 
+from __future__ import annotations
 from inspect import CO_VARARGS, CO_VARKEYWORDS
-from typing import Callable, Union, Any, Generator
-from util import Void
-from enum import Flag, auto
+from collections.abc import Callable, Generator, Iterator
+from util import Void, Unknown, Undefined, Nil, Ambiguous
+from enum import IntFlag, auto
 from functools import singledispatch
+from itertools import chain, repeat
+from sys import intern
+from weakref import WeakKeyDictionary
+from operator import attrgetter
+from types import CodeType as Code
 
 
-class ArgKind(Flag):
+class ArgKind(IntFlag):
     """ Flag holds information on the argument kind.
     """
     POSARG = auto()
@@ -20,15 +26,18 @@ class ArgKind(Flag):
     AMBARG = POSARG | KWARG
 
     def __str__(self):
-        # Return the name of the instance, title-cased
-        return f"{self.name.title()}({self.value})"
+        # Return the name of the instance, title-cased. Named members use the
+        # precomputed table below; composite flags are formatted on demand
+        if (s := KIND_STRS.get(self)) is None:
+            s = f"{self.name.title()}({self.value})"
 
+        return s
+
+
+# Precomputed string forms of the named ArgKind members
+KIND_STRS = {k: f"{k.name.title()}({k.value})" for k in ArgKind.__members__.values()}
 
 # Global constants
-Code = (lambda x: x).__code__.__class__
-Unknown = Void.UNKNOWN
-Undefined = Void.UNDEFINED
-Nil = Void.NIL
 PosArg = ArgKind.POSARG
 KwArg = ArgKind.KWARG
 Varg = ArgKind.VARG
@@ -36,15 +45,10 @@ VarKw = ArgKind.VARKW
 AmbArg = ArgKind.AMBARG
 
 
-# Get code and flags objects
-def getcode(fun: Callable) -> Code:
-    # return this function's code object
-    return fun.__code__
-
-
-def getflags(fun: Callable) -> int:
-    # get this function's flags
-    return fun.__code__.co_flags
+# Get code and flags objects. These are C-level attribute getters, so
+# calling them doesn't cost a Python frame
+getcode = attrgetter("__code__")
+getflags = attrgetter("__code__.co_flags")
 
 
 # Check for vararg arguments
@@ -98,19 +102,22 @@ def argco(fun: Callable) -> int:
 # Get arguments, broken down by argument kinds
 def posargs(fun: Callable) -> tuple:
     # get a list of this function's positional arguments
-    return fun.__code__.co_varnames[:fun.__code__.co_argcount]
+    co = fun.__code__
+    return co.co_varnames[:co.co_argcount]
 
 
 def posxargs(fun: Callable) -> tuple:
     # get a list of this function's positional only arguments
-    return fun.__code__.co_varnames[:fun.__code__.co_posonlyargcount]
+    co = fun.__code__
+    return co.co_varnames[:co.co_posonlyargcount]
 
 
 def ambargs(fun: Callable) -> tuple:
     # get a list of this functions ambargs
-    posargs_i = fun.__code__.co_posonlyargcount
-    ambargs_i = fun.__code__.co_argcount
-    return fun.__code__.co_varnames[posargs_i:ambargs_i]
+    co = fun.__code__
+    posargs_i = co.co_posonlyargcount
+    ambargs_i = co.co_argcount
+    return co.co_varnames[posargs_i:ambargs_i]
 
 
 def kwargs(fun: Callable) -> tuple:
@@ -139,107 +146,167 @@ def funargs(fun: Callable) -> tuple:
 def vfunargs(fun: Callable) -> tuple:
     # Get a list of all arguments, including vargs and varkw
     co = fun.__code__
-    stop_i = co.co_argcount + co.co_kwonlyargcount + hasvargs(fun) + hasvarkw(fun)
+    nvargs = bool(co.co_flags & CO_VARARGS) + bool(co.co_flags & CO_VARKEYWORDS)
+    stop_i = co.co_argcount + co.co_kwonlyargcount + nvargs
     return co.co_varnames[:stop_i]
 
 
-# Get type and kind annotations.
-def argtypes(fun: Callable) -> dict:
-    # functional wrapper for annotations, sans-return type
-    t = {a: Unknown for a in funargs(fun)}
-    annotations = fun.__annotations__
+# Build type, kind, and default information from code-object fields. The
+# per-function helpers below and ArgSpec.__init__ both go through these, so
+# there's a single copy of each computation
+def buildtypes(names: tuple, annotations: dict) -> dict:
+    # Map each name to its annotation, or Unknown if it isn't annotated
+    return {a: annotations.get(a, Unknown) for a in names}
 
-    for a in annotations:
-        t[a] = annotations[a]
 
-    return t
+def buildkinds(posxco: int, argco: int, kwxco: int, hasvargs: bool, hasvarkw: bool) -> list:
+    # Get a list of the argument kinds, in co_varnames order
+    return ([PosArg] * posxco + [AmbArg] * (argco - posxco) + [KwArg] * kwxco
+            + [Varg] * hasvargs + [VarKw] * hasvarkw)
 
 
-def returntype(fun: Callable) -> Union[Void, type]:
-    # check for a return type in the function's signature and return it if it exists
-    if "return" in (a := fun.__annotations__):
-        return a["return"]
+def builddefaults(names: tuple, argco: int, od: tuple | None, kd: dict | None) -> dict:
+    # Map each name to its default in a single pass (positional defaults
+    # are right-aligned), or Undefined if it has none
+    od = od or ()
+    kd = kd or {}
+    posdefaults = chain(repeat(Undefined, argco - len(od)), od)
+    kwdefaults = (kd.get(a, Undefined) for a in names[argco:])
+
+    return dict(zip(names, chain(posdefaults, kwdefaults)))
 
-    return Unknown
 
+# Get type and kind annotations.
+def argtypes(fun: Callable) -> dict:
+    # functional wrapper for annotations, sans-return type
+    return buildtypes(funargs(fun), fun.__annotations__)
 
-def argkinds(fun: Callable) -> dict:
-    # Get a tuple of the argument kinds
-    argnames = vfunargs(fun)
-    argkinds = [PosArg] * posxargco(fun) + [AmbArg] * ambargco(fun) + [KwArg]
 
-    if hasvargs(fun):
-        argkinds.append(Varg)
+def returntype(fun: Callable) -> Void | type:
+    # check for a return type in the function's signature and return it if it exists
+    return fun.__annotations__.get("return", Unknown)
+
 
-    if hasvarkw(fun):
-        argkinds.append(VarKw)
+def argkinds(fun: Callable) -> list:
+    # Get a list of the argument kinds
+    co = fun.__code__
 
-    return argkinds
+    return buildkinds(co.co_posonlyargcount, co.co_argcount, co.co_kwonlyargcount,
+                      hasvargs(fun), hasvarkw(fun))
 
 
 def argdefaults(fun: Callable) -> dict:
     # Get a mapping of the default arguments for this function
-    co = fun.__code__
-    names = funargs(fun)
-    d = {a: Undefined for a in names}
+    return builddefaults(funargs(fun), fun.__code__.co_argcount,
+                         fun.__defaults__, fun.__kwdefaults__)
+
 
-    if (kd := fun.__kwdefaults__):
-        d.update(kd)
+def prefixmap(names: tuple) -> dict:
+    # Map every prefix of each name to that name, so that options can be
+    # abbreviated. Prefixes shared by several names map to Ambiguous, but
+    # a full name always maps to itself
+    prefixes = {}
 
-    if (od := fun.__defaults__):
-        stop_i = co.co_argcount
-        start_i = stop_i - len(od)
-        dnames = names[start_i:stop_i]
+    for name in names:
+        for i in range(1, len(name)):
+            prefix = intern(name[:i])
+            prefixes[prefix] = Ambiguous if prefix in prefixes else name
 
-        for i, dn in enumerate(dnames):
-            d[dn] = od[i]
+    prefixes.update((name, name) for name in names)
 
-    return d
+    return prefixes
 
 
 # These functions produce argument information for other functions
 # to query or try to match against
-def getfullargspec(fun: Callable) -> dict:
-    # Return a dictionary containing a full argument spec for fun - names,
-    # kinds, types, return type, and defaults
-    # TODO: Make this a class.
-    output = {}
-
-    output["names"] = vfunargs(fun)
-    output["defaults"] = argdefaults(fun)
-    output["kinds"] = argkinds(fun)
-    output["types"] = argtypes(fun)
-    output["return"] = returntype(fun)
-    output["posxargco"] = posxargco(fun)
-    output["ambargco"] = ambargco(fun)
-    output["kwxargco"] = kwxargco(fun)
-    output["hasvargs"] = hasvargs(fun)
-    output["hasvarkw"] = hasvarkw(fun)
-    output["posxnames"] = posxargs(fun)
-    output["kwxnames"] = kwxargs(fun)
-    output["ambnames"] = ambargs(fun)
-
-    return output
-
-
-def iterargspec(specsrc: Union[Callable, dict]) -> Generator[tuple, None, None]:
-    """ Return a generator that yields tuples with a complete 
+class ArgSpec:
+    """ ArgSpec holds a full argument spec for a function - names, kinds,
+        types, return type, and defaults, along with the counts and lookup
+        tables used to match command line arguments against it.
+    """
+    __slots__ = ("names", "defaults", "required", "kinds", "types", "returns",
+                 "posxargco", "ambargco", "kwxargco", "hasvargs", "hasvarkw",
+                 "posnames", "posxnames", "kwxnames", "ambnames", "prefixes",
+                 "minpos", "maxpos", "minkw", "maxkw", "rows")
+
+    def __init__(self, fun: Callable):
+        # Build every field from a single read of the code object, defaults
+        # and annotations, instead of going through the per-function helpers
+        # above (which each fetch and slice the code object again)
+        co = fun.__code__
+        varnames = co.co_varnames
+        annotations = fun.__annotations__
+        od = fun.__defaults__ or ()
+        kd = fun.__kwdefaults__ or {}
+        posxco = co.co_posonlyargcount
+        argco = co.co_argcount
+        kwxco = co.co_kwonlyargcount
+        stop_i = argco + kwxco
+
+        self.hasvargs = bool(co.co_flags & CO_VARARGS)
+        self.hasvarkw = bool(co.co_flags & CO_VARKEYWORDS)
+        self.names = varnames[:stop_i + self.hasvargs + self.hasvarkw]
+        self.posnames = varnames[:argco]
+        self.posxnames = varnames[:posxco]
+        self.ambnames = varnames[posxco:argco]
+        self.kwxnames = varnames[argco:stop_i]
+        self.posxargco = posxco
+        self.ambargco = argco - posxco
+        self.kwxargco = kwxco
+
+        funnames = varnames[:stop_i]
+        self.defaults = builddefaults(funnames, argco, od, kd)
+        self.required = frozenset(a for a, d in self.defaults.items() if d is Undefined)
+        self.types = buildtypes(funnames, annotations)
+        self.returns = annotations.get("return", Unknown)
+        self.kinds = buildkinds(posxco, argco, kwxco, self.hasvargs, self.hasvarkw)
+        # Positional-or-keyword names are always bound positionally or from
+        # their defaults, so only keyword-only names can be matched by options
+        self.prefixes = prefixmap(self.kwxnames)
+
+        self.minpos = min(posxco, argco - len(od))
+        self.maxpos = self.minpos + self.ambargco
+        self.minkw = kwxco - len(kd)
+        self.maxkw = self.minkw + self.ambargco
+        self.rows = tuple(self._makerows())
+
+    def _makerows(self) -> Generator[tuple, None, None]:
+        # Yield a (name, index, default, kind, type) row for each argument
+        varkinds = Varg | VarKw
+
+        for i, name in enumerate(self.names):
+            kind = self.kinds[i]
+
+            if not kind & varkinds:
+                yield (name, i, self.defaults[name], kind, self.types[name])
+
+            else:
+                yield (name, i, Nil, kind, Nil)
+
+    def __repr__(self):
+        # Show every field, in the order they're declared
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self.__slots__)
+
+        return f"ArgSpec({fields})"
+
+
+# ArgSpecs that have already been built, keyed weakly by their function
+ARGSPEC_CACHE = WeakKeyDictionary()
+
+
+def getfullargspec(fun: Callable) -> ArgSpec:
+    # Return an ArgSpec containing a full argument spec for fun. The spec only
+    # depends on fun's signature, so it's built once per function and cached
+    if (argspec := ARGSPEC_CACHE.get(fun)) is None:
+        argspec = ARGSPEC_CACHE[fun] = ArgSpec(fun)
+
+    return argspec
+
+
+def iterargspec(specsrc: Callable | ArgSpec) -> Iterator[tuple]:
+    """ Return an iterator that yields tuples with a complete
         spec for each argument in turn.
     """
-    argspec = specsrc if isinstance(specsrc, dict) else getfullargspec(specsrc)
-
-    defaults = argspec["defaults"]
-    kinds = argspec["kinds"]
-    argtypes = argspec["types"]
-
-    for i, name in enumerate(argspec["names"]):
-        kind = kinds[i]
-        if kind not in {VarKw, Varg}:
-            default = defaults[name]
-            argtype = argtypes[name]
-
-        else:
-            default = Nil
-            argtype = Nil
+    argspec = specsrc if isinstance(specsrc, ArgSpec) else getfullargspec(specsrc)
 
-        yield (name, i, default, kind, argtype)
+    return iter(argspec.rows)
@@ -14,6 +14,10 @@ def microcli(app):
         and attempt to match them to arguments in the wrapped function using its
         argspec.
     """
+    # The argspec and option resolver only depend on app's signature, so
+    # build them once here
+    argspec = mui.getfullargspec(app)
+    resolve = cli_p.makeresolver(argspec)
 
     @wraps(app)
     def wrapper(argv):
@@ -21,13 +25,13 @@ def microcli(app):
             the script name from sys.argv.
         """
         argl = argv[1:]
+        seen = set(argl)
 
-        if "-h" in argl or "--help" in argl:
+        if not seen.isdisjoint(("-h", "--help")):
             print(app.__doc__)
             quit(0)
 
-        debug = "-d" in argl or "--debug" in argl
-        argspec = mui.getfullargspec(app)
+        debug = not seen.isdisjoint(("-d", "--debug"))
         pos, opt = cli_p.parseargs(argl)
 
         if debug:
@@ -36,7 +40,7 @@ def microcli(app):
             print(f"Parsed options: {opt}")
             print(f"argspec: {argspec}")
 
-        m_pos, m_opt = cli_p.matchargs(pos, opt, argspec)
+        m_pos, m_opt = cli_p.matchargs(pos, opt, argspec, resolve)
 
         if m_pos is None:
             if debug:
@@ -13,6 +13,7 @@ class Void(Enum):
     UNKNOWN = 1
     UNDEFINED = 2
     NIL = 3
+    AMBIGUOUS = 4
 
     def __bool__(self):
         # Like None, Void values are falsy
@@ -20,5 +21,14 @@ class Void(Enum):
 
     def __str__(self):
         # Return a title-cased version of the instance's name
-        return f"{self.name.title()}-({self.value})"
+        return VOID_STRS[self]
 
+
+# Precomputed string forms of the Void members
+VOID_STRS = {v: f"{v.name.title()}-({v.value})" for v in Void}
+
+# Aliases for the Void members, shared by the other microcli modules
+Unknown = Void.UNKNOWN
+Undefined = Void.UNDEFINED
+Nil = Void.NIL
+Ambiguous = Void.AMBIGUOUS